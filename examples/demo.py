@@ -11,6 +11,11 @@ from redis_websocket_api.geo_protocol import GeoCommandsMixin
 from redis_websocket_api.exceptions import (
     RemoteMessageHandlerError, InternalMessageHandlerError)
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional, the default loop works as well
+    uvloop = None
+
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.DEBUG)
 
@@ -82,6 +87,8 @@ async def example_producer():
 
 
 def main():
+    if uvloop is not None:
+        uvloop.install()
     loop = asyncio.get_event_loop()
     loop.create_task(example_producer())
 
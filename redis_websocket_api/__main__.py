@@ -11,6 +11,11 @@ import aioredis
 
 from redis_websocket_api import WebsocketHandler, WebsocketServer
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional, the default loop works as well
+    uvloop = None
+
 
 class PublishEverythingHandler(WebsocketHandler):
     def channel_is_allowed(self, channel_name):
@@ -19,6 +24,8 @@ class PublishEverythingHandler(WebsocketHandler):
 
 def main():
     basicConfig(level=INFO)
+    if uvloop is not None:
+        uvloop.install()
     redis = aioredis.from_url(
         getenv("REDIS_DSN", "redis:///"), encoding="utf-8", decode_responses=True
     )
@@ -1,28 +1,52 @@
 from collections import namedtuple
 from functools import lru_cache
-from logging import getLogger
+from logging import DEBUG, getLogger
 
+import numpy
 import pyproj
 
+try:
+    from numba import njit
+except ImportError:  # numba is optional, the numpy path works as well
+    njit = None
+
 __all__ = ["GeoCommandsMixin"]
 
 logger = getLogger(__name__)
 
+
+if njit is not None:
+
+    @njit(cache=True)
+    def _any_in_bbox(xs, ys, left, bottom, right, top):
+        for i in range(xs.size):
+            if left < xs[i] < right and bottom < ys[i] < top:
+                return True
+        return False
+
+else:
+    _any_in_bbox = None
+
 BoundingBox = namedtuple("BoundingBox", ["left", "bottom", "right", "top"])
 
 
 @lru_cache(maxsize=128)
 def get_projection(value):
-    return pyproj.CRS(value)
+    return pyproj.CRS.from_user_input(value)
 
 
-@lru_cache(maxsize=128)
-def get_transform_func(projection_in, projection_out, always_xy):
+@lru_cache(maxsize=256)
+def get_transformer(projection_in, projection_out, always_xy):
+    """Build a Transformer once per (in, out, axis-order) triple.
+
+    Keyed on the CRS srs strings: hashing those is much cheaper than
+    hashing CRS objects, which serialize to WKT first.
+    """
     return pyproj.Transformer.from_crs(
         projection_in,
         projection_out,
         always_xy=always_xy,
-    ).transform
+    )
 
 
 class GeoCommandsMixin:
@@ -39,61 +63,150 @@ class GeoCommandsMixin:
     bbox = None
 
     @staticmethod
-    def _is_collection(data):
-        return isinstance(data, dict) and data.get("type") == "FeatureCollection"
+    def _classify(data):
+        """Return an (is_collection, feature_type, is_multi) triple for data.
 
-    @staticmethod
-    def _feature_type(data):
-        if isinstance(data, dict) and data.get("type") == "Feature":
-            return data["geometry"]["type"]
-        else:
-            return None
+        feature_type is the geometry type with any "Multi" prefix stripped;
+        messages which are neither Feature nor FeatureCollection yield
+        (False, None, False).
+        """
+        data_type = data.get("type") if isinstance(data, dict) else None
+        if data_type == "Feature":
+            geometry_type = data["geometry"]["type"]
+            if geometry_type.startswith("Multi"):
+                return False, geometry_type[5:], True
+            return False, geometry_type, False
+        if data_type == "FeatureCollection":
+            return True, None, False
+        return False, None, False
 
     @staticmethod
     def _point_in_bbox(point, bbox):
         x, y = point
         return x > bbox.left and x < bbox.right and y > bbox.bottom and y < bbox.top
 
-    def _feature_coords_in_bbox(self, bbox, feature_type, coords):
-        if feature_type == "Polygon":
-            for ring in coords:
-                if any((self._point_in_bbox(point, bbox) for point in ring)):
-                    return True
+    @staticmethod
+    def _points_in_bbox(points, bbox):
+        """Return whether any of the given points lies within bbox.
+
+        Vectorized over the whole point sequence so the per-point work
+        happens in numpy instead of the interpreter.
+        """
+        if len(points) == 0:
+            # an empty geometry cannot intersect the bbox, and slicing
+            # an empty array below would raise IndexError
             return False
-        elif feature_type == "LineString":
-            return any((self._point_in_bbox(point, bbox) for point in coords))
-        elif feature_type == "Point":
+        coords = numpy.asarray(points, dtype=float)
+        xs = coords[:, 0]
+        ys = coords[:, 1]
+        # envelope test first: most geometries outside the viewport can
+        # be rejected on min/max alone, without the per-point mask
+        if (
+            xs.max() <= bbox.left
+            or xs.min() >= bbox.right
+            or ys.max() <= bbox.bottom
+            or ys.min() >= bbox.top
+        ):
+            return False
+        if _any_in_bbox is not None:
+            # compiled kernel short-circuits without temporary arrays
+            return bool(_any_in_bbox(xs, ys, *bbox))
+        return bool(
+            (
+                (xs > bbox.left)
+                & (xs < bbox.right)
+                & (ys > bbox.bottom)
+                & (ys < bbox.top)
+            ).any()
+        )
+
+    def _feature_coords_in_bbox(self, bbox, feature_type, coords):
+        # ordered by how common the types are in vehicle-position feeds
+        if feature_type == "Point":
             return self._point_in_bbox(coords, bbox)
+        elif feature_type == "LineString":
+            return self._points_in_bbox(coords, bbox)
+        elif feature_type == "Polygon":
+            # rings may differ in length, so test them one by one
+            return any((self._points_in_bbox(ring, bbox) for ring in coords))
 
         raise NotImplementedError(
             "Feature type {} is not supported yet".format(feature_type)
         )
 
-    def _transform_coords(self, feature_type, coords, transform_func):
-        if feature_type == "LineString":
-            return [transform_func(*point) for point in coords]
+    def _transform_coords(self, feature_type, coords, transformer):
+        # Transform all points of a geometry in one call instead of one
+        # call per point, so the per-call pyproj overhead is paid once.
+        if feature_type == "Point":
+            return transformer.transform(*coords)
+        elif feature_type == "LineString":
+            return list(transformer.itransform(coords))
         elif feature_type == "Polygon":
-            return [[transform_func(*point) for point in ring] for ring in coords]
-        elif feature_type == "Point":
-            return transform_func(*coords)
+            # flatten the rings so multi-ring geometries still need only
+            # one call, then slice the result back apart
+            flat = list(
+                transformer.itransform(
+                    [point for ring in coords for point in ring]
+                )
+            )
+            rings = []
+            start = 0
+            for ring in coords:
+                end = start + len(ring)
+                rings.append(flat[start:end])
+                start = end
+            return rings
 
         raise NotImplementedError(
             "Feature type {} is not supported yet".format(feature_type)
         )
 
+    def _is_projection_in(self, projection):
+        """Return whether the given value describes the same CRS as projection_in."""
+        try:
+            crs = get_projection(projection)
+        except pyproj.exceptions.CRSError:
+            return False
+        return crs is self.projection_in or crs == self.projection_in
+
     async def _handle_bbox_command(self, *args):
-        """Set BoundingBox and activate box_filter."""
-        if len(args) == 4:
-            left, bottom, right, top = map(float, args)
+        """Set BoundingBox and activate box_filter.
+
+        An optional fifth argument names the CRS the box is given in.
+        The box corners are transformed to projection_in once here, so
+        the per-message test keeps running in the input CRS.
+        """
+        if len(args) in (4, 5):
+            left, bottom, right, top = map(float, args[:4])
+            if len(args) == 5:
+                try:
+                    bbox_crs = get_projection(args[4])
+                except pyproj.exceptions.CRSError:
+                    logger.info(
+                        "Could not parse 'BBOX' CRS '%s' from %s.",
+                        args[4],
+                        self.remote_address,
+                    )
+                    return
+                if bbox_crs.srs != self.projection_in.srs:
+                    transformer = get_transformer(
+                        bbox_crs.srs, self.projection_in.srs, self.always_xy
+                    )
+                    (left, bottom), (right, top) = transformer.itransform(
+                        ((left, bottom), (right, top))
+                    )
             self.bbox = BoundingBox(left, bottom, right, top)
             self.filters["bbox"] = self._bbox_filter
+            if "projection" in self.filters:
+                # run the cheap rejection before the expensive transform
+                self.filters.move_to_end("projection")
             logger.debug(
                 "Client %s set self.bbox to %s",
-                self.websocket.remote_address,
+                self.remote_address,
                 self.bbox,
             )
         elif len(args) == 0 and self.filters.pop("bbox", None):
-            logger.debug("Client %s removed self.bbox", self.websocket.remote_address)
+            logger.debug("Client %s removed self.bbox", self.remote_address)
 
     async def _handle_projection_command(self, *args):
         """Set projection_out and activate projection_filter."""
@@ -101,32 +214,40 @@ class GeoCommandsMixin:
             logger.warning(
                 "Got %s arguments for 'PROJECTION' from %s, expected 1.",
                 len(args),
-                self.websocket.remote_address,
+                self.remote_address,
             )
         else:
             (projection,) = args
-            if projection == self.default_projection:
-                if "projection" in self.filters:
-                    del self.filters["projection"]
+            if projection == self.default_projection or self._is_projection_in(
+                projection
+            ):
+                self.projection_out = None
+                if self.filters.pop("projection", None):
                     logger.debug(
                         "Removed 'PROJECTION' filter for %s",
-                        self.websocket.remote_address,
+                        self.remote_address,
                     )
             else:
                 try:
-                    self.projection_out = get_projection(projection)
+                    projection_out = get_projection(projection)
                 except pyproj.exceptions.CRSError:
                     logger.info(
                         "Could not set 'PROJECTION' to '%s' for %s.",
                         projection,
-                        self.websocket.remote_address,
+                        self.remote_address,
                     )
                 else:
+                    self.projection_out = projection_out
+                    # warm the process-wide transformer cache now so the
+                    # first message doesn't pay the Transformer setup
+                    get_transformer(
+                        self.projection_in.srs, projection_out.srs, self.always_xy
+                    )
                     self.filters["projection"] = self._projection_filter
                     logger.debug(
                         "Set 'PROJECTION' to '%s' for %s.",
                         projection,
-                        self.websocket.remote_address,
+                        self.remote_address,
                     )
 
     async def _handle_pget_command(
@@ -140,31 +261,36 @@ class GeoCommandsMixin:
 
         if ref is not None:
             source = "{} {}".format(channel_name, ref)
-            values = [await self.redis.hget(channel_name, ref, encoding="utf-8")]
+            values = [await self.redis.hget(channel_name, ref)]
         else:
             source = channel_name
-            values = await self.redis.hvals(channel_name, encoding="utf-8") or ()
+            values = await self.redis.hvals(channel_name) or ()
 
-        send_count = 0
+        # filter everything first, then flush the sends back-to-back so
+        # the frames coalesce in the transport buffer
+        outgoing = []
         for value in values:
             passed, data = self._apply_filters(value, exclude="projection")
-            passed = self._projection_filter(data, projection_out=projection_out)
-            if passed:
-                send_count += 1
-                await self._send(source, data, client_reference=client_ref)
+            if passed and self._projection_filter(data, projection_out=projection_out):
+                outgoing.append(data)
+
+        send_count = len(outgoing)
+        for data in outgoing:
+            await self._send(source, data, client_reference=client_ref)
 
         if send_count == 0:
             send_count = 1
             await self._send(channel_name, None, client_reference=client_ref)
 
-        logger.debug(
-            "Sent %s messages in response to 'PGET %s %s %s %s'.",
-            send_count,
-            channel_name,
-            ref,
-            client_ref,
-            projection,
-        )
+        if logger.isEnabledFor(DEBUG):
+            logger.debug(
+                "Sent %s messages in response to 'PGET %s %s %s %s'.",
+                send_count,
+                channel_name,
+                ref,
+                client_ref,
+                projection,
+            )
 
     def _bbox_filter(self, data, bbox=None):
         """Include Feature or FeatureCollection if any of it's coordinates is within bbox.
@@ -174,18 +300,18 @@ class GeoCommandsMixin:
         :param bbox: BoundingBox to filer by (default: self.bbox)
         """
         bbox = bbox or self.bbox
-        if self._is_collection(data):
+        is_collection, feature_type, is_multi = self._classify(data)
+        if is_collection:
             return any(
                 map(lambda item: self._bbox_filter(item, bbox), data["features"])
             )
 
-        feature_type = self._feature_type(data)
         if feature_type is not None and bbox:
             try:
-                if feature_type.startswith("Multi"):
+                if is_multi:
                     return any(
                         (
-                            self._feature_coords_in_bbox(bbox, feature_type[5:], item)
+                            self._feature_coords_in_bbox(bbox, feature_type, item)
                             for item in data["geometry"]["coordinates"]
                         )
                     )
@@ -196,53 +322,55 @@ class GeoCommandsMixin:
             except NotImplementedError:
                 logger.warning(
                     "Not applying BBOX filter to Feature type '%s' in %s",
-                    feature_type,
+                    data["geometry"]["type"],
                     data,
                 )
 
         return True  # Only filter objects we could handle above
 
-    def _projection_filter(self, data, projection_out=None, transform_func=None):
+    def _projection_filter(self, data, projection_out=None, transformer=None):
         """Transform coordinates in Feature or FeatureCollection to projection_out.
 
         Uses self.projection_out set by PROJECTION by default.
         """
-        if not (projection_out or self.projection_out):
-            return True  # Do not filter anything, do not transform anything
-
-        # create once at start of recursion, then pass down
-        transform_func = transform_func or get_transform_func(
-            self.projection_in, projection_out or self.projection_out, self.always_xy
-        )
+        if transformer is None:
+            # resolve once at start of recursion, then pass down; the
+            # None/identity exit only triggers for direct calls (PGET),
+            # the filter itself is only registered for a real transform
+            projection_out = projection_out or self.projection_out
+            if projection_out is None or projection_out.srs == self.projection_in.srs:
+                return True
+            transformer = get_transformer(
+                self.projection_in.srs, projection_out.srs, self.always_xy
+            )
 
-        if self._is_collection(data):
+        is_collection, feature_type, is_multi = self._classify(data)
+        if is_collection:
             for item in data["features"]:
                 self._projection_filter(
                     item,
                     projection_out=projection_out,
-                    transform_func=transform_func,
+                    transformer=transformer,
                 )
-        else:
-            feature_type = self._feature_type(data)
-            if feature_type is not None:
-                try:
-                    if feature_type.startswith("Multi"):
-                        data["geometry"]["coordinates"] = [
-                            self._transform_coords(
-                                feature_type[5:], item, transform_func
-                            )
-                            for item in data["geometry"]["coordinates"]
-                        ]
-                    else:
-                        data["geometry"]["coordinates"] = self._transform_coords(
-                            feature_type,
-                            data["geometry"]["coordinates"],
-                            transform_func,
-                        )
-                except NotImplementedError:
-                    logger.warning(
-                        "Not projecting feature of type '%s': %s", feature_type, data
+        elif feature_type is not None:
+            try:
+                if is_multi:
+                    data["geometry"]["coordinates"] = [
+                        self._transform_coords(feature_type, item, transformer)
+                        for item in data["geometry"]["coordinates"]
+                    ]
+                else:
+                    data["geometry"]["coordinates"] = self._transform_coords(
+                        feature_type,
+                        data["geometry"]["coordinates"],
+                        transformer,
                     )
+            except NotImplementedError:
+                logger.warning(
+                    "Not projecting feature of type '%s': %s",
+                    data["geometry"]["type"],
+                    data,
+                )
         return True  # Do not filter anything, just transform data
 
 
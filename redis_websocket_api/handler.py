@@ -1,42 +1,102 @@
 import asyncio
 from collections import OrderedDict
-from logging import getLogger
-from json import loads, dumps, JSONDecodeError
-from datetime import datetime
+from functools import lru_cache
+from logging import DEBUG, getLogger
+from json import JSONDecodeError
+from time import time_ns
 
 from websockets.exceptions import ConnectionClosed
 
+try:
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so the
+    # error handling below keeps working with either implementation
+    from orjson import loads, dumps as _orjson_dumps
+
+    def dumps(obj):
+        # orjson emits bytes; decode so outbound frames stay text frames
+        return _orjson_dumps(obj).decode()
+
+except ImportError:  # orjson is optional, stdlib json works as well
+    from json import loads, dumps
+
 from .protocol import CommandsMixin, Message
 from .exceptions import RemoteMessageHandlerError, InternalMessageHandlerError
 
 logger = getLogger(__name__)
 
 
+@lru_cache(maxsize=128)
+def _parse_remote_message(message):
+    """Split a client message into (command, args, kwargs).
+
+    Clients tend to repeat identical messages (PING, re-SUB after
+    reconnect), so parse results are memoized. Callers must not mutate
+    the returned args/kwargs; dispatch only ever unpacks them.
+    """
+    command, *arguments = message.split()
+    args = []
+    kwargs = {}
+    for arg in arguments:
+        name, sep, value = arg.partition("=")
+        if sep:
+            kwargs[name] = value
+        else:
+            args.append(arg)
+    return command, args, kwargs
+
+
 class WebsocketHandlerBase:
     """Define protocol for communication between web client and server."""
 
     read_timeout = NotImplemented
     allowed_commands = NotImplemented
+    _command_handlers = {}
+
+    def __init_subclass__(cls, **kwargs):
+        """Resolve allowed_commands to a dispatch dict once per class.
 
-    def __init__(self, redis, websocket, read_timeout=None):
+        Saves the per-message tuple scan and getattr and makes a typo in
+        allowed_commands fail at class creation instead of at runtime.
+        """
+        super().__init_subclass__(**kwargs)
+        if cls.allowed_commands is not NotImplemented:
+            cls._command_handlers = {
+                name: getattr(cls, "_handle_{}_command".format(name.lower()))
+                for name in cls.allowed_commands
+            }
+
+    def __init__(
+        self,
+        redis,
+        websocket,
+        read_timeout=None,
+        channel_index=None,
+        max_queue_size=None,
+    ):
         self.websocket = websocket
+        # remote_address is assembled from transport info on access;
+        # fetch it once for the log calls below
+        self.remote_address = websocket.remote_address
         self.redis = redis
         self.read_timeout = read_timeout or self.read_timeout
 
-        self.queue = asyncio.Queue()
+        # a maxsize of 0 means unbounded; the server drops messages for
+        # handlers whose queue is full instead of buffering without limit
+        self.queue = asyncio.Queue(maxsize=max_queue_size or 0)
 
         self.filters = OrderedDict()
         self.subscriptions = set()
+        # channel name -> set of handlers, shared with the server so
+        # pub/sub dispatch is a dict lookup instead of a handler scan
+        self.channel_index = channel_index if channel_index is not None else {}
 
     async def _websocket_reader(self):
         try:
             while True:
-                await self.queue.put(
-                    Message(source="websocket", content=await self.websocket.recv())
-                )
+                await self.queue.put(Message("websocket", await self.websocket.recv()))
         except ConnectionClosed:
             logger.debug(
-                "Connection was closed by client %s", self.websocket.remote_address
+                "Connection was closed by client %s", self.remote_address
             )
 
     def _apply_filters(self, message, exclude=()):
@@ -56,64 +116,71 @@ class WebsocketHandlerBase:
                 "Decoding '{}' failed.".format(message)
             ) from e
 
-        passes = all(
-            (func(data) for name, func in self.filters.items() if name not in exclude)
-        )
-        return passes, data
+        if not self.filters:
+            return True, data
+
+        if exclude:
+            funcs = [
+                func for name, func in self.filters.items() if name not in exclude
+            ]
+        else:
+            funcs = self.filters.values()
+        for func in funcs:
+            if not func(data):
+                return False, data
+        return True, data
 
     async def _queue_reader(self):
         source, message = await asyncio.wait_for(self.queue.get(), self.read_timeout)
-        if source == "websocket":
-            await self._handle_remote_message(message)
-        else:
-            passes, data = self._apply_filters(message)
-            if passes:
-                await self._send(source, data)
+        # drain whatever else arrived in the meantime, so bursts don't
+        # pay the wait_for timeout machinery once per message
+        while True:
+            if source == "websocket":
+                await self._handle_remote_message(message)
+            else:
+                passes, data = self._apply_filters(message)
+                if passes:
+                    await self._send(source, data)
+            try:
+                source, message = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
 
     async def _send(self, source, data, client_reference=None):
         await self.websocket.send(
             dumps(
-                dict(
-                    source=source,
-                    content=data,
-                    timestamp=datetime.now().timestamp() * 1000,  # how JS expects it
-                    client_reference=client_reference,
-                )
+                {
+                    "source": source,
+                    "content": data,
+                    "timestamp": time_ns() // 1_000_000,  # ms, for JS
+                    "client_reference": client_reference,
+                }
             )
         )
 
     def _parse_remote_message(self, message):
-        command, *arguments = message.split()
-        args = []
-        kwargs = {}
-        for arg in arguments:
-            if "=" in arg:
-                name, value = arg.split("=", 1)
-                kwargs[name] = value
-            else:
-                args.append(arg)
-        return command, args, kwargs
+        return _parse_remote_message(message)
 
     async def _handle_remote_message(self, message):
         try:
             command, args, kwargs = self._parse_remote_message(message)
-            if command not in self.allowed_commands:
+            handler = self._command_handlers.get(command)
+            if handler is None:
                 # Don't even echo it back, most likely it's spam!
                 logger.info(
                     "Got unknown command '%s' from %s!",
                     command,
-                    self.websocket.remote_address,
+                    self.remote_address,
                 )
                 return
-            logger.debug(
-                "Processing command '%s' with args %s from %s.",
-                command,
-                args,
-                self.websocket.remote_address,
-            )
-            await getattr(self, "_handle_{}_command".format(command.lower()))(
-                *args, **kwargs
-            )
+            if logger.isEnabledFor(DEBUG):
+                logger.debug(
+                    "Processing command '%s' with args %s from %s.",
+                    command,
+                    args,
+                    self.remote_address,
+                )
+            await handler(self, *args, **kwargs)
         except asyncio.CancelledError:
             raise
         except Exception as e:
@@ -129,9 +196,22 @@ class WebsocketHandlerBase:
         return True
 
     @classmethod
-    async def create(cls, redis, websocket, read_timeout=None):
+    async def create(
+        cls,
+        redis,
+        websocket,
+        read_timeout=None,
+        channel_index=None,
+        max_queue_size=None,
+    ):
         """Create a handler instance setting up tasks and queues."""
-        self = cls(redis, websocket, read_timeout=read_timeout)
+        self = cls(
+            redis,
+            websocket,
+            read_timeout=read_timeout,
+            channel_index=channel_index,
+            max_queue_size=max_queue_size,
+        )
         self.consumer_task = asyncio.ensure_future(self._websocket_reader())
         return self
 
@@ -150,10 +230,20 @@ class WebsocketHandlerBase:
 
     async def close(self):
         """Close all connections and cancel all tasks."""
-        asyncio.wait_for(  # attempt to say goodbye to the client
-            self.websocket.close(), self.read_timeout
-        )
+        for channel_name in self.subscriptions:
+            subscribers = self.channel_index.get(channel_name)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del self.channel_index[channel_name]
         self.consumer_task.cancel()
+        # say goodbye to the client and reap the reader in one await;
+        # gather swallows the CancelledError and any close timeout
+        await asyncio.gather(
+            asyncio.wait_for(self.websocket.close(), self.read_timeout),
+            self.consumer_task,
+            return_exceptions=True,
+        )
 
 
 class WebsocketHandler(WebsocketHandlerBase, CommandsMixin):
@@ -161,7 +251,18 @@ class WebsocketHandler(WebsocketHandlerBase, CommandsMixin):
 
     read_timeout = 30
     allowed_commands = "SUB", "DEL", "PING", "GET"
-    channel_names = set()
+    _channel_names = frozenset()
+
+    @property
+    def channel_names(self):
+        """Channels accessible through the API."""
+        return self._channel_names
+
+    @channel_names.setter
+    def channel_names(self, value):
+        # stored as a frozenset so channel_is_allowed stays O(1) even
+        # when callers assign a list
+        self._channel_names = frozenset(value)
 
     def channel_is_allowed(self, channel_name):
         """Return whether the given channel should be accessible
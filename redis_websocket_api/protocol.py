@@ -1,5 +1,5 @@
 from collections import namedtuple
-from logging import getLogger
+from logging import DEBUG, getLogger
 
 logger = getLogger(__name__)
 
@@ -22,11 +22,17 @@ class CommandsMixin:
     async def _handle_del_command(self, channel_name):
         """Delete a redis channel subscription."""
         self.subscriptions.discard(channel_name)
+        subscribers = self.channel_index.get(channel_name)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.channel_index[channel_name]
 
     async def _handle_sub_command(self, channel_name):
         """Subscribe to redis channel"""
         if self.channel_is_allowed(channel_name):
             self.subscriptions.add(channel_name)
+            self.channel_index.setdefault(channel_name, set()).add(self)
 
     async def _handle_ping_command(self, *args):
         """Prevent client-side timeout using a keep-alive message."""
@@ -54,15 +60,18 @@ class CommandsMixin:
             source = channel_name
             values = await self.redis.hvals(channel_name)
 
-            send_count = 0
+            # filter everything first, then flush the sends back-to-back
+            # so the frames coalesce in the transport buffer
+            outgoing = []
             if values is not None:
                 for value in values:
                     passed, data = self._apply_filters(value)
                     if passed:
-                        send_count += 1
-                        await self._send(
-                            channel_name, data, client_reference=client_ref
-                        )
+                        outgoing.append(data)
+
+            send_count = len(outgoing)
+            for data in outgoing:
+                await self._send(channel_name, data, client_reference=client_ref)
 
             if send_count == 0:
                 logger.info(
@@ -71,9 +80,10 @@ class CommandsMixin:
                 send_count = 1
                 await self._send(channel_name, None, client_reference=client_ref)
 
-        logger.debug(
-            "Sent %s messages in response to 'GET %s %s'.",
-            send_count,
-            channel_name,
-            ref,
-        )
+        if logger.isEnabledFor(DEBUG):
+            logger.debug(
+                "Sent %s messages in response to 'GET %s %s'.",
+                send_count,
+                channel_name,
+                ref,
+            )
@@ -6,6 +6,11 @@ from websockets import serve
 from redis_websocket_api.handler import WebsocketHandler, WebsocketHandlerBase
 from redis_websocket_api.protocol import Message
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional, the default loop works as well
+    uvloop = None
+
 logger = getLogger(__name__)
 
 
@@ -21,7 +26,12 @@ class WebsocketServer:
     handler_class = WebsocketHandler
 
     def __init__(
-        self, redis, read_timeout=None, keep_alive_timeout=None, handler_class=None
+        self,
+        redis,
+        read_timeout=None,
+        keep_alive_timeout=None,
+        handler_class=None,
+        max_queue_size=None,
     ):
         """Set default values for new WebsocketHandlers.
 
@@ -30,11 +40,15 @@ class WebsocketServer:
            checked and kept if still open (does not cancel an open connection)
         :param keep_alive_timeout: Time after which the server cancels the
            handler task (independently of it's internal state)
+        :param max_queue_size: Bound for each handler's message queue;
+           messages for a handler with a full queue are dropped
         """
 
         self.read_timeout = read_timeout
         self.keep_alive_timeout = keep_alive_timeout
+        self.max_queue_size = max_queue_size
         self.handlers = {}
+        self.channel_index = {}
         self.redis = redis
         if handler_class is not None:
             if issubclass(handler_class, WebsocketHandlerBase):
@@ -47,17 +61,47 @@ class WebsocketServer:
     async def websocket_handler(self, websocket, path):
         """Return handler for a single websocket connection."""
 
-        logger.info("Client %s connected", websocket.remote_address)
+        remote_address = websocket.remote_address
+        logger.info("Client %s connected", remote_address)
         handler = await self.handler_class.create(
-            self.redis, websocket, read_timeout=self.read_timeout,
+            self.redis,
+            websocket,
+            read_timeout=self.read_timeout,
+            channel_index=self.channel_index,
+            max_queue_size=self.max_queue_size,
         )
-        self.handlers[websocket.remote_address] = handler
+        # keyed by the websocket object itself: identity hashing is
+        # cheaper than hashing the address tuple and cannot collide
+        self.handlers[websocket] = handler
         try:
-            await asyncio.wait_for(handler.listen(), self.keep_alive_timeout)
+            if self.keep_alive_timeout is None:
+                await handler.listen()
+            else:
+                # cheaper than asyncio.wait_for: one timer instead of a
+                # wrapper task, with the same TimeoutError contract
+                listen_task = asyncio.ensure_future(handler.listen())
+                timed_out = False
+
+                def cancel_listen():
+                    nonlocal timed_out
+                    timed_out = True
+                    listen_task.cancel()
+
+                timer = asyncio.get_event_loop().call_later(
+                    self.keep_alive_timeout, cancel_listen
+                )
+                try:
+                    await listen_task
+                except asyncio.CancelledError:
+                    if timed_out:
+                        raise asyncio.TimeoutError from None
+                    raise
+                finally:
+                    timer.cancel()
         finally:
-            del self.handlers[websocket.remote_address]
+            del self.handlers[websocket]
             await handler.close()
-            logger.info("Client %s removed", websocket.remote_address)
+            logger.info("Client %s removed", remote_address)
 
     async def redis_subscribe(self, p, channel_names=(), channel_patterns=()):
         """Subscribe to channels by channel_names and/or channel_patterns."""
@@ -65,11 +109,12 @@ class WebsocketServer:
         if not (channel_names or channel_patterns):
             raise ValueError("Got nothing to subscribe to")
 
-        for name in channel_names:
-            await p.subscribe(name)
+        # one round-trip for all names, one for all patterns
+        if channel_names:
+            await p.subscribe(*channel_names)
 
-        for pattern in channel_patterns:
-            await p.psubscribe(pattern)
+        if channel_patterns:
+            await p.psubscribe(*channel_patterns)
 
     async def redis_reader(self, channel_names=(), channel_patterns=()):
         """Pass messages from subscribed channels to handlers."""
@@ -78,28 +123,37 @@ class WebsocketServer:
 
         async with psub as p:
             await self.redis_subscribe(p, channel_names, channel_patterns)
-            while True:
-                message = await p.get_message(
-                    # Coution: without a timeout `get_message` yields
-                    # immidiatly without waiting for a message.
-                    ignore_subscribe_messages=True,
-                    timeout=60,
-                )
-                if message is not None:
-                    channel_name = message["channel"] or message["pattern"]
-
-                    for handler in self.handlers.values():
-                        if channel_name in handler.subscriptions:
-                            handler.queue.put_nowait(
-                                Message(source=channel_name, content=message["data"])
-                            )
+            # avoid attribute lookups inside the per-message loop
+            get_subscribers = self.channel_index.get
+            # listen() keeps a single coroutine parked on the socket read,
+            # so there is no polling timeout to re-arm between messages
+            async for message in p.listen():
+                if message["type"] not in ("message", "pmessage"):
+                    continue
+                channel_name = message["channel"] or message["pattern"]
+
+                # one immutable Message shared by all subscribers
+                queued = Message(channel_name, message["data"])
+                for handler in get_subscribers(channel_name, ()):
+                    try:
+                        handler.queue.put_nowait(queued)
+                    except asyncio.QueueFull:
+                        logger.warning(
+                            "Queue of client %s is full, dropping message"
+                            " from channel %s",
+                            handler.remote_address,
+                            channel_name,
+                        )
 
         psub.close()
 
     def listen(self, host, port, channel_names=(), channel_patterns=(), loop=None):
         """Listen for websocket connections and manage redis subscriptions."""
 
-        loop = loop or asyncio.get_event_loop()
+        if loop is None:
+            if uvloop is not None:
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            loop = asyncio.get_event_loop()
         start_server = serve(self.websocket_handler, host, port)
         loop.run_until_complete(start_server)
         logger.info("Listening on %s:%s...", host, port)
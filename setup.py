@@ -21,7 +21,11 @@ setup(
     keywords="tralis websocket websockets aioredis redis",
     packages=["redis_websocket_api"],
     install_requires=["aioredis", "websockets", "hiredis"],
-    extras_require={"testing": ["pytest"], "geo": ["pyproj>=2.2.0"]},
+    extras_require={
+        "testing": ["pytest"],
+        "geo": ["pyproj>=2.2.0", "numpy"],
+        "speedups": ["numba", "orjson", "uvloop"],
+    },
     python_requires=">=3.7",
     classifiers=[
         "Programming Language :: Python :: 3",
@@ -1,14 +1,20 @@
+import asyncio
 from unittest.mock import MagicMock
 
 import pytest
 
 from redis_websocket_api import WebsocketHandler, WebsocketServer
 
+try:
+    import uvloop
+except ImportError:  # uvloop is optional, the default loop works as well
+    pass
+else:
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
 
 @pytest.fixture
 def loop():
-    import asyncio
-
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     try:
@@ -45,6 +51,17 @@ def redis():
     return AsyncMagicMock()
 
 
+@pytest.fixture
+def sent(websocket):
+    """Return the payload of the index-th websocket.send call."""
+
+    def sent(index=0):
+        # not Call.args: that property only exists on Python >= 3.8
+        return websocket.await_send.call_args_list[index][0][0]
+
+    return sent
+
+
 @pytest.fixture
 def handler(websocket, redis):
     return WebsocketHandler(redis=redis, websocket=websocket)
@@ -77,6 +77,27 @@ def test_bbox_command(loop, geo_handler):
     assert "bbox" not in geo_handler.filters
 
 
+def test_bbox_command_with_crs(loop, geo_handler):
+    loop.run_until_complete(
+        geo_handler._handle_remote_message(
+            "BBOX 111319.49079327357 222684.20850554405"
+            " 333958.4723798207 445640.10965602624 epsg:3857"
+        )
+    )
+    assert geo_handler.bbox == approx_((1.0, 2.0, 3.0, 4.0), abs=1e-6)
+
+    loop.run_until_complete(geo_handler._handle_remote_message("BBOX"))
+    assert "bbox" not in geo_handler.filters
+    loop.run_until_complete(geo_handler._handle_remote_message("BBOX 1 2 3 4 egg"))
+    assert "bbox" not in geo_handler.filters
+
+
+def test_bbox_runs_before_projection(loop, geo_handler):
+    loop.run_until_complete(geo_handler._handle_remote_message("PROJECTION epsg:3857"))
+    loop.run_until_complete(geo_handler._handle_remote_message("BBOX 1 2 3 4"))
+    assert list(geo_handler.filters) == ["bbox", "projection"]
+
+
 def test_bbox_filter(loop, geo_handler):
     loop.run_until_complete(geo_handler._handle_remote_message("BBOX 1 2 3 4"))
     assert "bbox" in geo_handler.filters
@@ -344,7 +365,7 @@ def test_feature_collection_projection_filter(loop, geo_handler):
     )
 
 
-def test_pget_command(loop, geo_handler, redis, websocket):
+def test_pget_command(loop, geo_handler, redis, websocket, sent):
     with pytest.raises(RemoteMessageHandlerError):
         loop.run_until_complete(geo_handler._handle_remote_message("PGET"))
 
@@ -352,33 +373,39 @@ def test_pget_command(loop, geo_handler, redis, websocket):
     redis.await_hvals.assert_not_called()
 
     loop.run_until_complete(geo_handler._handle_remote_message("PGET egg"))
-    redis.await_hvals.assert_called_once_with("egg", encoding="utf-8")
-    assert '"source": "egg"' in websocket.await_send.call_args_list[0][0][0]
+    redis.await_hvals.assert_called_once_with("egg")
+    assert loads(sent())["source"] == "egg"
 
     loop.run_until_complete(geo_handler._handle_remote_message("PGET egg ref"))
-    redis.await_hget.assert_called_once_with("egg", "ref", encoding="utf-8")
+    redis.await_hget.assert_called_once_with("egg", "ref")
 
     redis.await_hget.reset_mock()
     websocket.await_send.reset_mock()
     loop.run_until_complete(geo_handler._handle_remote_message("PGET egg ref cref"))
-    redis.await_hget.assert_called_once_with("egg", "ref", encoding="utf-8")
-    assert '"client_reference": "cref"' in websocket.await_send.call_args_list[0][0][0]
+    redis.await_hget.assert_called_once_with("egg", "ref")
+    assert (
+        loads(sent())["client_reference"]
+        == "cref"
+    )
 
     redis.await_hget.reset_mock()
     websocket.await_send.reset_mock()
     loop.run_until_complete(
         geo_handler._handle_remote_message("PGET egg ref client_ref=cref")
     )
-    assert '"client_reference": "cref"' in websocket.await_send.call_args_list[0][0][0]
+    assert (
+        loads(sent())["client_reference"]
+        == "cref"
+    )
 
     redis.await_hvals.reset_mock()
     redis.await_hvals.return_value = ['{"hello": "world"}']
     websocket.await_send.reset_mock()
     loop.run_until_complete(geo_handler._handle_remote_message("PGET egg"))
-    redis.await_hvals.assert_called_once_with("egg", encoding="utf-8")
-    assert (
-        '"content": {"hello": "world"}' in websocket.await_send.call_args_list[0][0][0]
-    )
+    redis.await_hvals.assert_called_once_with("egg")
+    assert loads(sent())["content"] == {
+        "hello": "world"
+    }
 
     source_data = [
         get_feature_collection(
@@ -393,8 +420,8 @@ def test_pget_command(loop, geo_handler, redis, websocket):
     redis.await_hvals.return_value = source_data
     websocket.await_send.reset_mock()
     loop.run_until_complete(geo_handler._handle_remote_message("PGET egg"))
-    redis.await_hvals.assert_called_once_with("egg", encoding="utf-8")
-    result = loads(websocket.await_send.call_args_list[0][0][0])
+    redis.await_hvals.assert_called_once_with("egg")
+    result = loads(sent())
     assert result["content"] == loads(source_data[0])
 
     redis.await_hvals.reset_mock()
@@ -403,11 +430,23 @@ def test_pget_command(loop, geo_handler, redis, websocket):
     loop.run_until_complete(
         geo_handler._handle_remote_message("PGET egg projection=epsg:3857")
     )
-    redis.await_hvals.assert_called_once_with("egg", encoding="utf-8")
-    result = loads(websocket.await_send.call_args_list[0][0][0])
+    redis.await_hvals.assert_called_once_with("egg")
+    result = loads(sent())
     assert result["content"] != loads(source_data[0])
 
 
+def test_pget_command_respects_bbox(loop, geo_handler, redis, websocket, sent):
+    loop.run_until_complete(geo_handler._handle_remote_message("BBOX 0 0 10 10"))
+    redis.await_hvals.return_value = [
+        get_geojson("Point", "5.0, 5.0"),
+        get_geojson("Point", "20.0, 20.0"),
+    ]
+    loop.run_until_complete(geo_handler._handle_remote_message("PGET egg"))
+    redis.await_hvals.assert_called_once_with("egg")
+    assert websocket.await_send.call_count == 1
+    assert loads(sent())["content"]["geometry"]["coordinates"] == [5.0, 5.0]
+
+
 def test_axis_order(loop, geo_handler, strict_geo_handler):
     for handler in geo_handler, strict_geo_handler:
         loop.run_until_complete(handler._handle_remote_message("PROJECTION epsg:3857"))
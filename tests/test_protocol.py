@@ -1,68 +1,93 @@
 import pytest
+from json import loads
 
 from redis_websocket_api.exceptions import RemoteMessageHandlerError
 
 
-def test_errors(loop, handler):
+@pytest.mark.parametrize("message", ["", "SUB", "GET"])
+def test_invalid_messages_raise(loop, handler, message):
     with pytest.raises(RemoteMessageHandlerError):
-        loop.run_until_complete(handler._handle_remote_message(""))
+        loop.run_until_complete(handler._handle_remote_message(message))
 
+
+def test_unknown_command_is_ignored(loop, handler):
     assert (
         loop.run_until_complete(handler._handle_remote_message("unknown cmd")) is None
     )
 
 
 def test_subsription_commands(loop, handler):
-    with pytest.raises(RemoteMessageHandlerError):
-        loop.run_until_complete(handler._handle_remote_message("SUB"))
-
     handler.channel_names = ["egg"]
-    assert "egg" not in handler.subscriptions
-    loop.run_until_complete(handler._handle_remote_message("SUB egg"))
-    assert "egg" in handler.subscriptions
-    loop.run_until_complete(handler._handle_remote_message("DEL egg"))
-    assert "egg" not in handler.subscriptions
-    assert loop.run_until_complete(handler._handle_remote_message("DEL egg")) is None
 
+    # one run_until_complete for the whole scenario instead of one per
+    # command, so the loop is entered once
+    async def scenario():
+        assert "egg" not in handler.subscriptions
+        await handler._handle_remote_message("SUB egg")
+        assert "egg" in handler.subscriptions
+        # subscribing twice is idempotent
+        await handler._handle_remote_message("SUB egg")
+        assert handler.subscriptions == {"egg"}
+        await handler._handle_remote_message("DEL egg")
+        assert "egg" not in handler.subscriptions
+        assert await handler._handle_remote_message("DEL egg") is None
+
+    loop.run_until_complete(scenario())
 
-def test_get_command(loop, handler, redis, websocket):
-    with pytest.raises(RemoteMessageHandlerError):
-        loop.run_until_complete(handler._handle_remote_message("GET"))
 
+def test_get_command_channel_not_allowed(loop, handler, redis):
     loop.run_until_complete(handler._handle_remote_message("GET egg"))
     redis.await_hvals.assert_not_called()
 
+
+def test_get_command(loop, handler, redis, sent):
     handler.channel_names = ["egg"]
     loop.run_until_complete(handler._handle_remote_message("GET egg"))
     redis.await_hvals.assert_called_once_with("egg")
-    assert '"source": "egg"' in websocket.await_send.call_args_list[0][0][0]
+    assert loads(sent())["source"] == "egg"
+
 
+def test_get_command_with_ref(loop, handler, redis):
+    handler.channel_names = ["egg"]
     loop.run_until_complete(handler._handle_remote_message("GET egg ref"))
     redis.await_hget.assert_called_once_with("egg", "ref")
 
-    redis.await_hget.reset_mock()
-    websocket.await_send.reset_mock()
-    loop.run_until_complete(handler._handle_remote_message("GET egg ref cref"))
-    redis.await_hget.assert_called_once_with("egg", "ref")
-    assert '"client_reference": "cref"' in websocket.await_send.call_args_list[0][0][0]
 
-    redis.await_hget.reset_mock()
-    websocket.await_send.reset_mock()
-    loop.run_until_complete(
-        handler._handle_remote_message("GET egg ref client_ref=cref")
+@pytest.mark.parametrize(
+    "message", ["GET egg ref cref", "GET egg ref client_ref=cref"]
+)
+def test_get_command_with_client_ref(loop, handler, redis, sent, message):
+    handler.channel_names = ["egg"]
+    loop.run_until_complete(handler._handle_remote_message(message))
+    redis.await_hget.assert_called_once_with("egg", "ref")
+    assert (
+        loads(sent())["client_reference"]
+        == "cref"
     )
-    assert '"client_reference": "cref"' in websocket.await_send.call_args_list[0][0][0]
 
-    redis.await_hvals.reset_mock()
+
+def test_get_command_with_values(loop, handler, redis, sent):
+    handler.channel_names = ["egg"]
     redis.await_hvals.return_value = ['{"hello": "world"}']
-    websocket.await_send.reset_mock()
     loop.run_until_complete(handler._handle_remote_message("GET egg"))
     redis.await_hvals.assert_called_once_with("egg")
-    assert (
-        '"content": {"hello": "world"}' in websocket.await_send.call_args_list[0][0][0]
-    )
+    assert loads(sent())["content"] == {
+        "hello": "world"
+    }
+
+
+def test_get_command_flushes_all_values(loop, handler, redis, websocket, sent):
+    handler.channel_names = ["egg"]
+    redis.await_hvals.return_value = ['{"a": 1}', '{"b": 2}', '{"c": 3}']
+    loop.run_until_complete(handler._handle_remote_message("GET egg"))
+    assert websocket.await_send.call_count == 3
+    assert [loads(sent(i))["content"] for i in range(3)] == [
+        {"a": 1},
+        {"b": 2},
+        {"c": 3},
+    ]
 
 
-def test_ping_pong(loop, handler, websocket):
+def test_ping_pong(loop, handler, sent):
     loop.run_until_complete(handler._handle_remote_message("PING"))
-    assert '"content": "PONG"' in websocket.await_send.call_args_list[0][0][0]
+    assert loads(sent())["content"] == "PONG"
@@ -1,21 +1,23 @@
-import asyncio
+from json import loads
 from unittest.mock import MagicMock
 
-import pytest
 from websockets import exceptions
 
+# built once; raising the same instance per test skips re-running the
+# close-frame formatting in ConnectionClosed.__init__
+CONNECTION_CLOSED = exceptions.ConnectionClosed(1001, "foo")
 
-def test_websocket_handler_creation(loop, server, websocket):
+
+def test_websocket_handler_creation(loop, server, websocket, sent):
     server.handlers = MagicMock()
-    websocket.await_recv.side_effect = exceptions.ConnectionClosed(1001, "foo")
+    websocket.await_recv.side_effect = CONNECTION_CLOSED
 
-    with pytest.warns(RuntimeWarning):
-        asyncio.run(server.websocket_handler(websocket, "/foo"))
+    loop.run_until_complete(server.websocket_handler(websocket, "/foo"))
 
     assert websocket.await_recv.call_count == 1
     assert websocket.await_send.call_count == 1
-    sent_str = websocket.await_send.call_args_list[0][0][0]
-    assert '"status": "open"' in sent_str
+    sent_str = sent()
+    assert loads(sent_str)["content"] == {"status": "open"}
 
     assert server.handlers.__setitem__.call_count == 1
-    assert server.handlers.__delitem__.called_once_with(("EGG", 2000))
+    server.handlers.__delitem__.assert_called_once_with(websocket)